@@ -0,0 +1 @@
+"""Process a My Clippings.txt file and index it in a database"""
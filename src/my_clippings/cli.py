@@ -0,0 +1,402 @@
+"""Command-line entry point
+
+    my-clippings ingest "My Clippings.txt" --workers 4 --batch-size 1000
+    my-clippings query titles
+    my-clippings query timeline --daily
+    my-clippings query overlaps TITLE 1200 1500
+    my-clippings query highlights --backend memory --file "My Clippings.txt" TITLE
+    my-clippings export --format json --output clippings.json
+    my-clippings bench "My Clippings.txt" --workers 4
+
+ingest only imports psycopg2 and tqdm inside its database functions, so
+`--help` and the memory backend never load them.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from my_clippings import ingest
+
+BACKENDS = ["postgres", "memory"]
+EXPORT_FIELDS = ["kind", "title", "start_loc", "end_loc", "datetime", "content"]
+FILE_HELP = "clippings file, required with the memory backend"
+
+
+def read_clippings(fn):
+    with open(fn) as f:
+        return "".join(f.readlines())
+
+
+def get_cache(args):
+    if args.no_cache:
+        return None
+    return ingest.ParseCache(args.cache_dir)
+
+
+def get_connection(args):
+    return ingest.get_db_connection(dsn=args.dsn)
+
+
+def load_records(args, fn):
+    if fn is None:
+        sys.exit("--file is required with the memory backend")
+    return ingest.parse_clippings(
+        read_clippings(fn), get_cache(args), workers=args.workers
+    )
+
+
+def cmd_ingest(args):
+    if args.backend == "memory":
+        records = load_records(args, args.fn)
+        notes, highlights = ingest.records_to_clippings(records)
+        print(f"parsed {len(highlights)} highlights and {len(notes)} notes")
+        return
+
+    connection = get_connection(args)
+    try:
+        ingest.Highlight.create_table(connection)
+        ingest.Note.create_table(connection)
+        ingest.import_clippings(
+            args.fn,
+            connection,
+            cache=get_cache(args),
+            batch_size=args.batch_size,
+            workers=args.workers,
+        )
+    finally:
+        connection.close()
+
+
+def cmd_query_titles(args):
+    if args.backend == "memory":
+        records = load_records(args, args.file)
+        notes, highlights = ingest.records_to_clippings(records)
+        clippings = highlights if args.table == "highlights" else notes
+        titles = sorted({c.title for c in clippings})
+    else:
+        connection = get_connection(args)
+        try:
+            titles = ingest.get_titles(connection, args.table)
+        finally:
+            connection.close()
+    for title in titles:
+        print(title)
+
+
+def cmd_query_highlights(args):
+    if args.backend == "memory":
+        _, highlights = ingest.records_to_clippings(load_records(args, args.file))
+        results = [
+            (h.content, h.start_loc, h.end_loc)
+            for h in highlights
+            if h.title == args.title
+        ]
+        results.sort(key=lambda r: (r[1], r[2]))
+    else:
+        connection = get_connection(args)
+        try:
+            results = ingest.get_highlights(connection, args.title)
+        finally:
+            connection.close()
+    for content, start_loc, end_loc in results:
+        print(f"{start_loc}-{end_loc}\t{content}")
+
+
+def cmd_query_overlaps(args):
+    if args.backend == "memory":
+        records = load_records(args, args.file)
+        index = ingest.build_interval_index(*ingest.records_to_clippings(records))
+        tree = index.get(args.title, ingest.IntervalTree([]))
+        results = [
+            (type(c).__name__.lower(), c.content, start_loc, end_loc)
+            for start_loc, end_loc, c in tree.overlapping(args.start, args.end)
+        ]
+        results.sort(key=lambda r: (r[2], r[3]))
+    else:
+        connection = get_connection(args)
+        try:
+            results = ingest.get_overlapping(
+                connection, args.title, args.start, args.end
+            )
+        finally:
+            connection.close()
+    for kind, content, start_loc, end_loc in results:
+        print(f"{kind}\t{start_loc}-{end_loc}\t{content}")
+
+
+def cmd_query_coverage(args):
+    if args.backend == "memory":
+        _, highlights = ingest.records_to_clippings(load_records(args, args.file))
+        intervals = {}
+        for h in highlights:
+            if args.title is None or h.title == args.title:
+                intervals.setdefault(h.title, []).append((h.start_loc, h.end_loc))
+        covered = {t: ingest.coverage(ivs) for t, ivs in intervals.items()}
+    else:
+        connection = get_connection(args)
+        try:
+            covered = ingest.get_coverage(connection, args.title)
+        finally:
+            connection.close()
+    for title, locations in sorted(covered.items()):
+        print(f"{locations}\t{title}")
+
+
+def cmd_query_timeline(args):
+    connection = get_connection(args)
+    try:
+        if args.daily:
+            rows = ingest.get_daily_timeline(connection, args.title)
+        else:
+            rows = ingest.get_book_timeline(connection, args.title)
+    finally:
+        connection.close()
+    for row in rows:
+        print("\t".join(str(value) for value in row))
+
+
+def cmd_export(args):
+    if args.backend == "memory":
+        notes, highlights = ingest.records_to_clippings(load_records(args, args.file))
+        rows = []
+        for c in notes + highlights:
+            if args.title is not None and c.title != args.title:
+                continue
+            # notes only have an end_loc, get_clippings repeats it as start_loc
+            start_loc = c.end_loc if c.start_loc is None else c.start_loc
+            kind = type(c).__name__.lower()
+            rows.append((kind, c.title, start_loc, c.end_loc, c.dt, c.content))
+        rows.sort(key=lambda r: r[1:5])
+    else:
+        connection = get_connection(args)
+        try:
+            rows = ingest.get_clippings(connection, args.title)
+        finally:
+            connection.close()
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        if args.format == "csv":
+            writer = csv.writer(out)
+            writer.writerow(EXPORT_FIELDS)
+            for row in rows:
+                writer.writerow(row[:4] + (row[4].isoformat(),) + row[5:])
+        else:
+            clippings = [dict(zip(EXPORT_FIELDS, row)) for row in rows]
+            for clipping in clippings:
+                clipping["datetime"] = clipping["datetime"].isoformat()
+            json.dump(clippings, out, ensure_ascii=False, indent=2)
+            out.write("\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def cmd_bench(args):
+    all_raw_clippings = read_clippings(args.fn)
+
+    def timed(label, func, setup=None):
+        best = None
+        for _ in range(args.repeat):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{label:<24}{best * 1000:10.1f} ms")
+        return result
+
+    cache_dir = args.cache_dir
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(ingest.default_cache_dir()), "bench")
+    cache = ingest.ParseCache(cache_dir)
+
+    def parse(cache=None):
+        return ingest.parse_clippings(all_raw_clippings, cache, workers=args.workers)
+
+    records = timed("parse", parse)
+    timed("parse, cold cache", lambda: parse(cache), setup=cache.clear)
+    timed("parse, warm cache", lambda: parse(cache))
+    print(f"{len(records)} clippings")
+
+    if args.backend == "postgres":
+        bench_write(args, records, timed)
+
+
+def bench_write(args, records, timed):
+    """Time writing records into a scratch schema, emptied before every
+    repeat and dropped afterwards, so the user's tables are never touched"""
+
+    notes, highlights = ingest.records_to_clippings(records)
+    schema = f"my_clippings_bench_{os.getpid()}"
+    connection = get_connection(args)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE SCHEMA {schema};")
+            cursor.execute(f"SET search_path TO {schema}, public;")
+        connection.commit()
+        ingest.Highlight.create_table(connection)
+        ingest.Note.create_table(connection)
+
+        def truncate():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "TRUNCATE highlights, notes, book_timeline, daily_timeline;"
+                )
+            connection.commit()
+
+        def write():
+            ingest.Note.write_many_to_db(connection, notes, args.batch_size)
+            ingest.Highlight.write_many_to_db(
+                connection, highlights, args.batch_size
+            )
+
+        timed("write", write, setup=truncate)
+    finally:
+        connection.rollback()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE;")
+        connection.commit()
+        connection.close()
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def dsn_parser():
+    dsn = argparse.ArgumentParser(add_help=False)
+    dsn.add_argument(
+        "--dsn",
+        default=os.environ.get("MYCLIPPINGS_DSN"),
+        help="libpq connection string, defaults to $MYCLIPPINGS_DSN",
+    )
+    return dsn
+
+
+def backend_parser(default):
+    """Parent parser for --backend and --dsn. Parents share their actions, so
+    every subcommand needs its own copy to get its own default backend"""
+
+    backend = argparse.ArgumentParser(add_help=False, parents=[dsn_parser()])
+    backend.add_argument("--backend", choices=BACKENDS, default=default)
+    return backend
+
+
+def build_parser():
+    parallel = argparse.ArgumentParser(add_help=False)
+    parallel.add_argument("--workers", type=positive_int, default=1)
+    parallel.add_argument("--batch-size", type=positive_int, default=500)
+
+    cache = argparse.ArgumentParser(add_help=False)
+    cache.add_argument("--cache-dir", default=None)
+    cache.add_argument("--no-cache", action="store_true")
+
+    # commands that read stored clippings only parse a file with the memory
+    # backend, so they take --file and --workers but no --batch-size
+    memory_file = argparse.ArgumentParser(add_help=False)
+    memory_file.add_argument("--file", help=FILE_HELP)
+    memory_file.add_argument(
+        "--workers",
+        type=positive_int,
+        default=1,
+        help="processes parsing --file with the memory backend",
+    )
+
+    parser = argparse.ArgumentParser(
+        prog="my-clippings", description="Index a Kindle My Clippings.txt file"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser(
+        "ingest",
+        parents=[backend_parser("postgres"), parallel, cache],
+        help="parse a clippings file and store it in the database",
+    )
+    ingest_parser.add_argument("fn", metavar="FILE")
+    ingest_parser.set_defaults(func=cmd_ingest)
+
+    query_parser = subparsers.add_parser("query", help="read stored clippings")
+    queries = query_parser.add_subparsers(dest="query", required=True)
+    query_parents = [backend_parser("postgres"), memory_file, cache]
+
+    titles_parser = queries.add_parser("titles", parents=query_parents)
+    titles_parser.add_argument(
+        "--table", choices=["highlights", "notes"], default="highlights"
+    )
+    titles_parser.set_defaults(func=cmd_query_titles)
+
+    highlights_parser = queries.add_parser("highlights", parents=query_parents)
+    highlights_parser.add_argument("title")
+    highlights_parser.set_defaults(func=cmd_query_highlights)
+
+    overlaps_parser = queries.add_parser(
+        "overlaps",
+        parents=query_parents,
+        help="highlights and notes of a book between two locations",
+    )
+    overlaps_parser.add_argument("title")
+    overlaps_parser.add_argument("start", type=int)
+    overlaps_parser.add_argument("end", type=int)
+    overlaps_parser.set_defaults(func=cmd_query_overlaps)
+
+    coverage_parser = queries.add_parser(
+        "coverage",
+        parents=query_parents,
+        help="number of distinct locations highlighted per book",
+    )
+    coverage_parser.add_argument("--title")
+    coverage_parser.set_defaults(func=cmd_query_coverage)
+
+    timeline_parser = queries.add_parser(
+        "timeline",
+        parents=[dsn_parser()],
+        help="first and last highlight, count and coverage per book",
+    )
+    timeline_parser.add_argument("--title")
+    timeline_parser.add_argument(
+        "--daily", action="store_true", help="one row per day instead of per book"
+    )
+    timeline_parser.set_defaults(func=cmd_query_timeline)
+
+    export_parser = subparsers.add_parser(
+        "export",
+        parents=[backend_parser("postgres"), memory_file, cache],
+        help="write highlights and notes as CSV or JSON",
+    )
+    export_parser.add_argument("--title")
+    export_parser.add_argument("--format", choices=["csv", "json"], default="csv")
+    export_parser.add_argument("--output", help="defaults to stdout")
+    export_parser.set_defaults(func=cmd_export)
+
+    bench_parser = subparsers.add_parser(
+        "bench",
+        parents=[backend_parser("memory"), parallel],
+        help="time parsing, with and without the parse cache, and with "
+        "--backend postgres writing into a scratch schema",
+    )
+    bench_parser.add_argument("fn", metavar="FILE")
+    bench_parser.add_argument("--repeat", type=positive_int, default=3)
+    bench_parser.add_argument(
+        "--cache-dir", help="scratch parse cache, cleared on every run"
+    )
+    bench_parser.set_defaults(func=cmd_bench)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1141 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import concurrent.futures
+import datetime
+import hashlib
+import json
+import os
+import zlib
+
+# psycopg2 and tqdm are imported inside the functions that need them, so
+# parsing, the parse cache and the interval index work without them
+
+"""
+Types of clippings:
+    - Note
+    - Highlight
+
+Information in each kind:
+    - Note:
+        - Title (str)
+        - Location (int)
+        - Date Added (datetime)
+        - Note (str)
+    - Highlight
+        - Title (str)
+        - Location Range (int, int)
+        - Date Added (datetime)
+        - Highlight (str)
+
+
+Overall project
+
+- ingest notes
+- read through them
+- separate them into individual tags
+- UID seems to be the title, location (end range) and datetime
+- store in database
+
+Database Schema
+- two intermediate tables, join into the final table that relates them
+
+Notes
+    - Title (str)
+    - Location (int)
+    - Date Added (datetime)
+    - Note (str)
+
+Highlights
+    - Title (str)
+    - Start Location (int)
+    - End Location (int)
+    - Date Added (datetime)
+    - Highlight (str)
+
+Clippings
+    - Title (required)
+    - Location start int
+    - Location (end) int (required)
+    - Date datetime (required)
+    - Highlight (required)
+    - Note (optional)
+
+"""
+
+
+CLIPPING_SEP = "==========\n"
+
+# Bump whenever Clipping parsing changes so stale parse cache entries are
+# ignored instead of being loaded
+PARSE_CACHE_VERSION = 2
+PARSE_CHUNK_SIZE = 64 * 1024
+DEFAULT_BATCH_SIZE = 500
+
+# Timelines group highlights by book, and by book and UTC day
+UTC_DAY = "(datetime AT TIME ZONE 'UTC')::date"
+TIMELINE_KEYS = {"book_timeline": "title", "daily_timeline": "title, day"}
+
+
+class PostgresImporter(ABC):
+    """Import objects into a database table"""
+
+    def __init__(
+        self,
+        db="myclippings",
+        usr="postgres",
+        pw="mypassword",
+        host="127.0.0.1",
+        port="5432",
+    ):
+        self.db = db
+        self.usr = usr
+        self.pw = pw
+        self.host = host
+        self.port = port
+        self.create_db()
+
+    def get_connection(self):
+        """Get connection object to database.
+        Although this is not generic, it's bound to postgres"""
+        import psycopg2
+
+        return psycopg2.connect(
+            database=self.db,
+            user=self.usr,
+            password=self.pw,
+            host=self.host,
+            port=self.port,
+        )
+
+    def get_sudo_connection(self):
+        import psycopg2
+        import psycopg2.extensions
+
+        connection = psycopg2.connect(
+            user=self.usr, password=self.pw, host=self.host, port=self.port
+        )
+        connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        return connection
+
+    def create_db(self):
+        """Create the database
+        https://pythontic.com/database/postgresql/create%20database"""
+
+        import psycopg2.errors
+
+        try:
+            connection = self.get_sudo_connection()
+            cursor = connection.cursor()
+            query = f"""CREATE DATABASE {self.db};"""
+            cursor.execute(query)
+            connection.commit()
+        except psycopg2.errors.DuplicateDatabase:
+            pass
+
+    def destroy_db(self):
+        import psycopg2.extensions
+
+        connection = self.get_sudo_connection()
+        connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        cursor = connection.cursor()
+        query = f"""DROP DATABASE {self.db};"""
+        cursor.execute(query)
+        connection.commit()
+
+    def create_table(self):
+        pass
+
+    def write_to_db(self):
+        '''
+        Pass arguments to sql statements like so:
+        conn.execute("""SELECT pet_name
+                       FROM pet
+                       WHERE name = %s""", (name,))
+        https://stackoverflow.com/a/42547594
+        '''
+        pass
+
+    def delete_from_db(self):
+        pass
+
+
+class Clipping(PostgresImporter):
+    def __init__(
+        self,
+        raw_clipping: str,
+    ):
+        """Data structure for the different parts of a clipping"""
+        self.title, self.metadata, self.content = self.process_clipping(raw_clipping)
+        self.kind = self.get_clipping_type(self.metadata)
+        self.location = self.get_clipping_location(self.metadata)
+        self.date = self.get_date(self.metadata)
+        self.dt = self.convert_parsed_date_to_datetime(self.date)
+
+    # can be made an abstract class and defined in subclasses Note and
+    # Highlight
+    def get_start_loc(self):
+        pass
+
+    def get_end_loc(self):
+        pass
+
+    def create_table(self):
+        pass
+
+    def write_to_db(self):
+        pass
+
+    def delete_from_db(self):
+        pass
+
+    def process_clipping(self, clipping):
+        """Split a clipping into its title, metadata and content """
+
+        clipping = clipping.split("\n")
+        title = clipping.pop(0)
+        metadata = clipping.pop(0)
+        assert clipping.pop(0) == "", "Unexpected Clipping Format"
+        return title, metadata, "\n".join(clipping)
+
+    def process_metadata(self, metadata):
+        # get location
+        # get type
+        # get date
+        pass
+
+    def get_clipping_type(self, metadata):
+        """Determine if type is highlight or note"""
+
+        temp = metadata.split("|")[0].split()
+        if len(temp) == 5:
+            _, _, type, _, _ = temp
+        if len(temp) == 6:
+            _, _, type, _, _, _ = temp
+        return type.lower()
+
+    def get_clipping_location(self, metadata):
+        """Might need to differentiate between location and location range"""
+
+        temp = metadata.split("|")[0].split()
+        if len(temp) == 5:
+            _, _, _, _, loc = temp
+        elif len(temp) == 6:
+            _, _, _, _, _, loc = temp
+        else:
+            raise NotImplementedError
+        return loc
+
+    def get_date(self, metadata):
+        """Parse date from metadata"""
+
+        temp = metadata.split("|")[1]
+        date = " ".join(temp.split()[2:])
+        return date
+
+    def convert_parsed_date_to_datetime(self, date):
+        _, month_name, day, year, time, semi = date.replace(",", "").split()
+        month = month_name_to_number(month_name)
+        hr, min, sec = time.split(":")
+        hr = int(hr)
+        if (semi == "PM") and (hr != 12):
+            hr = hr + 12
+        elif (semi == "AM") and (hr == 12):
+            hr = 0
+        dt = [year, month, day, hr, min, sec]
+        dt = [int(x) for x in dt]
+
+        return datetime.datetime(*dt).replace(tzinfo=datetime.timezone.utc)
+
+
+def month_name_to_number(name):
+    """Convert month name to month number
+    https://www.kite.com/python/answers/how-to-convert-between-month-name-and-month-number-in-python
+    """
+
+    return datetime.datetime.strptime(name, "%B").month
+
+
+class Note(Clipping):
+    def __init__(
+        self,
+        title: str,
+        content: str,
+        dt: datetime.datetime,
+        location: str,
+    ):
+        self.title = title
+        self.content = content
+        self.dt = dt
+        self.location = location
+        self.start_loc = self.get_start_loc()
+        self.end_loc = self.get_end_loc()
+
+    def get_start_loc(self):
+        return None
+
+    def get_end_loc(self):
+        return int(self.location)
+
+    @staticmethod
+    def create_table(connection):
+        """Create postgres table for notes.
+        Unique entries have a unique set of title, location and time.
+        loc_range is the location as a one element int4range with a GiST
+        index, for location overlap queries.
+        """
+
+        cursor = connection.cursor()
+        query = """CREATE TABLE IF NOT EXISTS notes (
+        id SERIAL,
+        title VARCHAR ( 500 ),
+        location INTEGER,
+        datetime TIMESTAMPTZ,
+        content TEXT,
+        PRIMARY KEY (title, location, datetime)
+        );
+        ALTER TABLE notes ADD COLUMN IF NOT EXISTS loc_range int4range
+        GENERATED ALWAYS AS (int4range(location, location, '[]')) STORED;
+        CREATE EXTENSION IF NOT EXISTS btree_gist;
+        CREATE INDEX IF NOT EXISTS notes_loc_range_idx
+        ON notes USING GIST (title, loc_range);"""
+        cursor.execute(query)
+        connection.commit()
+
+    def write_to_db(self, connection):
+        """Add note to database"""
+
+        cursor = connection.cursor()
+        query = """INSERT INTO notes
+        (title, location, datetime, content)
+        VALUES (%s, %s, %s, %s);
+        """
+        cursor.execute(query, (self.title, self.location, self.dt, self.content))
+        connection.commit()
+
+    @staticmethod
+    def write_many_to_db(connection, notes, batch_size=DEFAULT_BATCH_SIZE):
+        """Add notes to database in batches, skipping notes already stored"""
+
+        query = """INSERT INTO notes
+        (title, location, datetime, content)
+        VALUES %s
+        ON CONFLICT DO NOTHING;
+        """
+        rows = [(n.title, n.end_loc, n.dt, n.content) for n in notes]
+        import psycopg2.extras
+
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start : start + batch_size]
+                psycopg2.extras.execute_values(
+                    cursor, query, batch, page_size=batch_size
+                )
+                connection.commit()
+
+    def delete_from_db(self, connection):
+        """Delete note from database"""
+
+        cursor = connection.cursor()
+        query = """DELETE FROM notes
+        WHERE
+        location = %s AND
+        datetime = %s AND
+        content = %s;
+        """
+        cursor.execute(query, (self.location, self.dt, self.content))
+        connection.commit()
+
+
+class Highlight(Clipping):
+    def __init__(
+        self,
+        title: str,
+        content: str,
+        dt: datetime.datetime,
+        location: str,
+    ):
+        """Data structure for the different parts of a clipping"""
+        self.title = title
+        self.content = content
+        self.dt = dt
+        self.location = location
+        self.start_loc = self.get_start_loc()
+        self.end_loc = self.get_end_loc()
+
+    # can be made an abstract class and defined in subclasses Note and
+    # Highlight
+    def get_start_loc(self):
+        return int(self.location.split("-")[0])
+
+    def get_end_loc(self):
+        return int(self.location.split("-")[1])
+
+    @staticmethod
+    def create_table(connection):
+        """Create postgres table for highlights.
+        Unique entries have a unique set of title, location and time.
+        loc_range mirrors start_loc and end_loc as an int4range with a GiST
+        index, for location overlap queries.
+        """
+
+        cursor = connection.cursor()
+        query = """CREATE TABLE IF NOT EXISTS highlights (
+        id SERIAL,
+        title VARCHAR ( 500 ),
+        start_loc INTEGER,
+        end_loc INTEGER,
+        datetime TIMESTAMPTZ,
+        content TEXT,
+        PRIMARY KEY (title, start_loc, end_loc, datetime)
+        );
+        ALTER TABLE highlights ADD COLUMN IF NOT EXISTS loc_range int4range
+        GENERATED ALWAYS AS (int4range(start_loc, end_loc, '[]')) STORED;
+        CREATE EXTENSION IF NOT EXISTS btree_gist;
+        CREATE INDEX IF NOT EXISTS highlights_loc_range_idx
+        ON highlights USING GIST (title, loc_range);"""
+        cursor.execute(query)
+        connection.commit()
+        Highlight.create_timeline_tables(connection)
+
+    @staticmethod
+    def create_timeline_tables(connection):
+        """Create summary tables of highlights per book, per book and day,
+        and per day across every book. Inserting highlights adds the new rows
+        to them, so timelines are read without scanning highlights. coverage
+        is the number of distinct locations highlighted, counting overlapping
+        highlights once.
+        """
+
+        cursor = connection.cursor()
+        query = """CREATE TABLE IF NOT EXISTS book_timeline (
+        title VARCHAR ( 500 ),
+        first_datetime TIMESTAMPTZ,
+        last_datetime TIMESTAMPTZ,
+        highlight_count INTEGER,
+        min_loc INTEGER,
+        max_loc INTEGER,
+        coverage INTEGER,
+        PRIMARY KEY (title)
+        );
+        CREATE TABLE IF NOT EXISTS daily_timeline (
+        title VARCHAR ( 500 ),
+        day DATE,
+        first_datetime TIMESTAMPTZ,
+        last_datetime TIMESTAMPTZ,
+        highlight_count INTEGER,
+        min_loc INTEGER,
+        max_loc INTEGER,
+        coverage INTEGER,
+        PRIMARY KEY (title, day)
+        );
+        CREATE TABLE IF NOT EXISTS reading_days (
+        day DATE,
+        first_datetime TIMESTAMPTZ,
+        last_datetime TIMESTAMPTZ,
+        highlight_count INTEGER,
+        book_count INTEGER,
+        coverage INTEGER,
+        PRIMARY KEY (day)
+        );"""
+        cursor.execute(query)
+        connection.commit()
+
+        # fill the timelines of a database created before they existed
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM reading_days);")
+        if not cursor.fetchone()[0]:
+            Highlight.refresh_timelines(connection)
+
+    @staticmethod
+    def refresh_timelines(connection, titles=None):
+        """Recompute the timelines of titles, or of every book, from the
+        highlights table. Inserts update the timelines incrementally, but
+        deleted highlights need a recompute."""
+
+        cursor = connection.cursor()
+        if titles is None:
+            cursor.execute(
+                """DELETE FROM book_timeline;
+                DELETE FROM daily_timeline;
+                DELETE FROM reading_days;"""
+            )
+            where, days_where, params = "", "", {}
+        else:
+            params = {"titles": list(titles)}
+            cursor.execute(
+                """DELETE FROM book_timeline WHERE title = ANY(%(titles)s);
+                DELETE FROM daily_timeline WHERE title = ANY(%(titles)s)
+                RETURNING day;""",
+                params,
+            )
+            # reading_days of the days the titles had before and have after
+            params["days"] = [row[0] for row in cursor.fetchall()]
+            where = "WHERE title = ANY(%(titles)s)"
+            days_where = """WHERE day = ANY(%(days)s) OR day IN (
+            SELECT day FROM daily_timeline WHERE title = ANY(%(titles)s)
+            )"""
+        for table in TIMELINE_KEYS:
+            query = f"""WITH h AS (
+            SELECT *, {UTC_DAY} AS day FROM highlights {where}
+            )
+            {timeline_upsert_query(table, "h", "h")};"""
+            cursor.execute(query, params)
+        cursor.execute(
+            f"""DELETE FROM reading_days {days_where};
+            INSERT INTO reading_days
+            (day, first_datetime, last_datetime, highlight_count,
+            book_count, coverage)
+            SELECT day, MIN(first_datetime), MAX(last_datetime),
+            SUM(highlight_count), COUNT(*), SUM(coverage)
+            FROM daily_timeline
+            {days_where}
+            GROUP BY day;""",
+            params,
+        )
+        connection.commit()
+
+    def write_to_db(self, connection):
+        """Add highlight to database"""
+
+        cursor = connection.cursor()
+        query = with_timeline_update(
+            """INSERT INTO highlights
+        (title, start_loc, end_loc, datetime, content)
+        VALUES (%s, %s, %s, %s, %s)"""
+        )
+        cursor.execute(
+            query, (self.title, self.start_loc, self.end_loc, self.dt, self.content)
+        )
+        connection.commit()
+
+    @staticmethod
+    def write_many_to_db(connection, highlights, batch_size=DEFAULT_BATCH_SIZE):
+        """Add highlights to database in batches, skipping highlights already
+        stored. Only the rows actually inserted are added to the timelines."""
+
+        query = with_timeline_update(
+            """INSERT INTO highlights
+        (title, start_loc, end_loc, datetime, content)
+        VALUES %s
+        ON CONFLICT DO NOTHING"""
+        )
+        rows = [
+            (h.title, h.start_loc, h.end_loc, h.dt, h.content) for h in highlights
+        ]
+        import psycopg2.extras
+
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start : start + batch_size]
+                psycopg2.extras.execute_values(
+                    cursor, query, batch, page_size=batch_size
+                )
+                connection.commit()
+
+    def delete_from_db(self, connection):
+        """Delete highlight from database"""
+
+        cursor = connection.cursor()
+        query = """DELETE FROM highlights
+        WHERE
+        start_loc = %s AND
+        end_loc = %s AND
+        datetime = %s AND
+        content = %s;
+        """
+        cursor.execute(query, (self.start_loc, self.end_loc, self.dt, self.content))
+        connection.commit()
+        Highlight.refresh_timelines(connection, [self.title])
+
+
+def coverage_query(source, keys):
+    """SQL counting the distinct locations of the loc_ranges in source, any
+    relation with id, loc_range and keys columns, per group of keys.
+
+    Postgres 13 has no range_agg, so overlapping loc_ranges are merged with a
+    gaps-and-islands query: a range starts a new island when it begins after
+    every earlier range of its group has ended. id breaks ties so both
+    windows order duplicate ranges the same way.
+    """
+
+    return f"""SELECT {keys}, SUM(hi - lo) AS coverage FROM (
+        SELECT {keys}, MIN(lo) AS lo, MAX(hi) AS hi FROM (
+        SELECT {keys}, lo, hi,
+        SUM(CASE WHEN prev_hi IS NULL OR lo > prev_hi THEN 1 ELSE 0 END)
+        OVER (PARTITION BY {keys} ORDER BY lo, hi, id) AS island
+        FROM (
+        SELECT id, {keys}, lower(loc_range) AS lo, upper(loc_range) AS hi,
+        MAX(upper(loc_range)) OVER (
+            PARTITION BY {keys} ORDER BY lower(loc_range), upper(loc_range), id
+            ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+        ) AS prev_hi
+        FROM {source}
+        ) AS ordered
+        ) AS islands
+        GROUP BY {keys}, island
+        ) AS merged
+        GROUP BY {keys}"""
+
+
+def timeline_upsert_query(table, rows, ranges):
+    """SQL adding the highlights in rows, any relation with title, day,
+    start_loc, end_loc and datetime columns, to book_timeline or
+    daily_timeline. Counts and bounds are added to the stored ones, while
+    coverage is recomputed from every loc_range in ranges, which must hold
+    all highlights of the groups in rows."""
+
+    keys = TIMELINE_KEYS[table]
+    return f"""INSERT INTO {table} AS t
+        ({keys}, first_datetime, last_datetime, highlight_count,
+        min_loc, max_loc, coverage)
+        SELECT {keys}, MIN(datetime), MAX(datetime), COUNT(*),
+        MIN(start_loc), MAX(end_loc), c.coverage
+        FROM {rows}
+        JOIN ({coverage_query(ranges, keys)}) AS c USING ({keys})
+        GROUP BY {keys}, c.coverage
+        ON CONFLICT ({keys}) DO UPDATE SET
+        first_datetime = LEAST(t.first_datetime, EXCLUDED.first_datetime),
+        last_datetime = GREATEST(t.last_datetime, EXCLUDED.last_datetime),
+        highlight_count = t.highlight_count + EXCLUDED.highlight_count,
+        min_loc = LEAST(t.min_loc, EXCLUDED.min_loc),
+        max_loc = GREATEST(t.max_loc, EXCLUDED.max_loc),
+        coverage = EXCLUDED.coverage"""
+
+
+def with_timeline_update(insert_query):
+    """Wrap an INSERT INTO highlights so the same statement adds the rows it
+    inserted to the timelines. The rest of the statement sees highlights and
+    daily_timeline as they were before the insert, so ranges is the stored
+    highlights of the inserted titles plus the inserted rows, and old_daily
+    is what the touched days held before. reading_days gains the books new
+    to a day and the change in their daily coverage, as the coverage of
+    different books adds up."""
+
+    return f"""WITH new_rows AS (
+        {insert_query}
+        RETURNING id, title, start_loc, end_loc, datetime, loc_range,
+        {UTC_DAY} AS day
+        ), ranges AS (
+        SELECT id, title, loc_range, {UTC_DAY} AS day
+        FROM highlights
+        WHERE title IN (SELECT title FROM new_rows)
+        UNION ALL
+        SELECT id, title, loc_range, day FROM new_rows
+        ), old_daily AS (
+        SELECT title, day, coverage
+        FROM daily_timeline
+        WHERE title IN (SELECT title FROM new_rows)
+        ), book AS (
+        {timeline_upsert_query("book_timeline", "new_rows", "ranges")}
+        ), daily AS (
+        {timeline_upsert_query("daily_timeline", "new_rows", "ranges")}
+        RETURNING title, day, coverage
+        )
+        INSERT INTO reading_days AS r
+        (day, first_datetime, last_datetime, highlight_count,
+        book_count, coverage)
+        SELECT day, MIN(n.first_datetime), MAX(n.last_datetime),
+        SUM(n.highlight_count), COUNT(*) FILTER (WHERE o.title IS NULL),
+        SUM(d.coverage - COALESCE(o.coverage, 0))
+        FROM (
+        SELECT title, day, MIN(datetime) AS first_datetime,
+        MAX(datetime) AS last_datetime, COUNT(*) AS highlight_count
+        FROM new_rows
+        GROUP BY title, day
+        ) AS n
+        JOIN daily AS d USING (title, day)
+        LEFT JOIN old_daily AS o USING (title, day)
+        GROUP BY day
+        ON CONFLICT (day) DO UPDATE SET
+        first_datetime = LEAST(r.first_datetime, EXCLUDED.first_datetime),
+        last_datetime = GREATEST(r.last_datetime, EXCLUDED.last_datetime),
+        highlight_count = r.highlight_count + EXCLUDED.highlight_count,
+        book_count = r.book_count + EXCLUDED.book_count,
+        coverage = r.coverage + EXCLUDED.coverage;"""
+
+
+def split_clippings(clippings, sep=CLIPPING_SEP):
+    """Chunk full clippings text into a list of individual files
+    TODO: might need to consider that text may not fit in memory at once
+    (although that would be a ridiculously huge clippings file)"""
+
+    clippings_list = clippings.split(sep)
+    clippings_list = [c[:-1] for c in clippings_list]
+    # final item in split will be empty
+    return clippings_list[:-1]
+
+
+def chunk_clippings(clippings, chunk_size=PARSE_CHUNK_SIZE, sep=CLIPPING_SEP):
+    """Cut full clippings text into chunks of roughly chunk_size characters.
+    Every chunk ends right after a separator, so each chunk can go through
+    split_clippings on its own. Kindle only appends to the file, so earlier
+    chunks stay identical between runs."""
+
+    chunks = []
+    start = 0
+    while start < len(clippings):
+        end = clippings.find(sep, start + max(chunk_size - len(sep), 0))
+        if end == -1:
+            chunks.append(clippings[start:])
+            break
+        end += len(sep)
+        chunks.append(clippings[start:end])
+        start = end
+    return chunks
+
+
+def parse_clipping(raw_clipping):
+    """Parse a raw clipping into a (kind, title, content, dt, location) record"""
+
+    c = Clipping(raw_clipping)
+    return (c.kind, c.title, c.content, c.dt, c.location)
+
+
+def parse_chunk(chunk):
+    """Parse every clipping in a separator-aligned chunk"""
+
+    return [parse_clipping(rc) for rc in split_clippings(chunk)]
+
+
+class ParseCache:
+    """On-disk cache of parsed clipping records, keyed by chunk hash.
+
+    Each entry is the zlib-compressed JSON of the records of one chunk,
+    stamped with PARSE_CACHE_VERSION. Entries are plain data, never pickles,
+    so a tampered cache can't run code. Entries are evicted least recently used
+    first once the cache holds more than max_entries files or max_bytes on
+    disk.
+    """
+
+    def __init__(
+        self,
+        cache_dir=None,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_entries: int = 4096,
+    ):
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.entries = self.load_index()
+        self.total_bytes = sum(self.entries.values())
+
+    def load_index(self):
+        """Index existing entries by key, oldest access first"""
+
+        stats = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".chunk"):
+                continue
+            st = os.stat(os.path.join(self.cache_dir, name))
+            stats.append((st.st_mtime, name[: -len(".chunk")], st.st_size))
+        stats.sort()
+        return OrderedDict((key, size) for _, key, size in stats)
+
+    @staticmethod
+    def chunk_key(chunk):
+        h = hashlib.sha1(str(PARSE_CACHE_VERSION).encode())
+        h.update(chunk.encode())
+        return h.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ".chunk")
+
+    def get(self, chunk):
+        """Return the cached records of chunk, or None on a miss"""
+
+        key = self.chunk_key(chunk)
+        if key not in self.entries:
+            return None
+        path = self.entry_path(key)
+        try:
+            with open(path, "rb") as f:
+                records = self.decode(f.read())
+        except (OSError, zlib.error, ValueError, TypeError, KeyError):
+            records = None
+        if records is None:
+            self.discard(key)
+            return None
+        os.utime(path)
+        self.entries.move_to_end(key)
+        return records
+
+    def put(self, chunk, records):
+        """Store the parsed records of chunk and evict old entries"""
+
+        key = self.chunk_key(chunk)
+        data = self.encode(records)
+        path = self.entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.total_bytes -= self.entries.pop(key, 0)
+        self.entries[key] = len(data)
+        self.total_bytes += len(data)
+        self.evict()
+
+    @staticmethod
+    def encode(records):
+        """Serialize records with their datetimes as epoch seconds"""
+
+        rows = [
+            [kind, title, content, int(dt.timestamp()), location]
+            for kind, title, content, dt, location in records
+        ]
+        payload = {"version": PARSE_CACHE_VERSION, "records": rows}
+        return zlib.compress(json.dumps(payload, separators=(",", ":")).encode())
+
+    @staticmethod
+    def decode(data):
+        """Inverse of encode, None if the entry was written by another
+        parser version"""
+
+        payload = json.loads(zlib.decompress(data))
+        if payload["version"] != PARSE_CACHE_VERSION:
+            return None
+        return [
+            (
+                str(kind),
+                str(title),
+                str(content),
+                datetime.datetime.fromtimestamp(int(ts), datetime.timezone.utc),
+                str(location),
+            )
+            for kind, title, content, ts, location in payload["records"]
+        ]
+
+    def discard(self, key):
+        self.total_bytes -= self.entries.pop(key, 0)
+        try:
+            os.remove(self.entry_path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits its limits"""
+
+        while self.entries and (
+            len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes
+        ):
+            key = next(iter(self.entries))
+            self.discard(key)
+
+    def clear(self):
+        for key in list(self.entries):
+            self.discard(key)
+
+
+def default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    return os.path.join(base, "my-clippings", "parse")
+
+
+def parse_clippings(clippings, cache=None, chunk_size=PARSE_CHUNK_SIZE, workers=1):
+    """Parse full clippings text into a list of records, loading unchanged
+    chunks from cache instead of reparsing them. With workers > 1 the chunks
+    missing from the cache are parsed in a process pool."""
+
+    chunks = chunk_clippings(clippings, chunk_size)
+    parsed = [cache.get(c) if cache is not None else None for c in chunks]
+    missing = [i for i, chunk_records in enumerate(parsed) if chunk_records is None]
+    missing_chunks = [chunks[i] for i in missing]
+
+    if workers > 1 and len(missing_chunks) > 1:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            fresh = list(pool.map(parse_chunk, missing_chunks))
+    else:
+        fresh = [parse_chunk(c) for c in missing_chunks]
+
+    for i, chunk_records in zip(missing, fresh):
+        parsed[i] = chunk_records
+        if cache is not None:
+            cache.put(chunks[i], chunk_records)
+    return [record for chunk_records in parsed for record in chunk_records]
+
+
+def records_to_clippings(records):
+    """Turn parsed records into Note and Highlight objects, dropping other
+    kinds such as bookmarks"""
+
+    notes, highlights = [], []
+    for kind, title, content, dt, location in records:
+        if kind == "note":
+            notes.append(Note(title, content, dt, location))
+        if kind == "highlight":
+            highlights.append(Highlight(title, content, dt, location))
+    return notes, highlights
+
+
+def get_db_connection(
+    db: str = "myclippings",
+    usr: str = "postgres",
+    pw: str = "mypassword",
+    host: str = "127.0.0.1",
+    port="5432",
+    dsn: str = None,
+):
+    """Connect to the database. A libpq dsn such as
+    "dbname=myclippings host=127.0.0.1" takes precedence over the other
+    arguments"""
+
+    import psycopg2
+
+    if dsn:
+        return psycopg2.connect(dsn)
+    connection = psycopg2.connect(
+        database=db, user=usr, password=pw, host=host, port=port
+    )
+    return connection
+
+
+def import_clippings(
+    fn="../My Clippings-newest.txt",
+    connection=None,
+    cache=None,
+    batch_size=DEFAULT_BATCH_SIZE,
+    workers=1,
+):
+    import tqdm
+
+    if connection is None:
+        connection = PostgresImporter().get_connection()
+    with open(fn) as f:
+        all_raw_clippings = "".join(f.readlines())
+    records = parse_clippings(all_raw_clippings, cache, workers=workers)
+    notes, highlights = records_to_clippings(tqdm.tqdm(records))
+    Note.write_many_to_db(connection, notes, batch_size)
+    Highlight.write_many_to_db(connection, highlights, batch_size)
+
+
+def get_titles(connection, table):
+    cursor = connection.cursor()
+    query = f"""SELECT
+                DISTINCT title
+                FROM {table} ;
+                """
+    cursor.execute(query)
+    results = cursor.fetchall()
+    titles = [result[0] for result in results]
+    return titles
+
+
+def get_book_timeline(con, title=None):
+    """Read the timeline of a book, or of every book, most recent first"""
+
+    query = """SELECT title, first_datetime, last_datetime, highlight_count,
+                min_loc, max_loc, coverage
+                FROM book_timeline"""
+    params = ()
+    if title is not None:
+        query += " WHERE title = %s"
+        params = (title,)
+    query += " ORDER BY last_datetime DESC"
+    with con.cursor() as curs:
+        curs.execute(query, params)
+        return curs.fetchall()
+
+
+def get_daily_timeline(con, title=None):
+    """Read highlights per day for a book, or across every book. Days across
+    every book have a book count instead of location bounds."""
+
+    if title is None:
+        query = """SELECT day, first_datetime, last_datetime, highlight_count,
+                    book_count, coverage
+                    FROM reading_days
+                    ORDER BY day"""
+        params = ()
+    else:
+        query = """SELECT day, first_datetime, last_datetime, highlight_count,
+                    min_loc, max_loc, coverage
+                    FROM daily_timeline
+                    WHERE title = %s
+                    ORDER BY day"""
+        params = (title,)
+    with con.cursor() as curs:
+        curs.execute(query, params)
+        return curs.fetchall()
+
+
+def get_highlights(con, title):
+    query = """SELECT content, start_loc, end_loc
+                FROM highlights
+                WHERE title = %s
+                ORDER BY start_loc, end_loc"""
+    with con.cursor() as curs:
+        curs.execute(query, (title,))
+        results = curs.fetchall()
+        highlights = [r for r in results]
+    return highlights
+
+
+def get_clippings(con, title=None):
+    """Get every highlight and note, or those of one book, as
+    (kind, title, start_loc, end_loc, datetime, content) rows ordered by
+    title and location. Notes have start_loc == end_loc."""
+
+    query = """SELECT * FROM (
+                SELECT 'highlight' AS kind, title, start_loc, end_loc,
+                datetime, content
+                FROM highlights
+                UNION ALL
+                SELECT 'note', title, location, location, datetime, content
+                FROM notes
+                ) AS clippings"""
+    params = ()
+    if title is not None:
+        query += " WHERE title = %s"
+        params = (title,)
+    query += " ORDER BY title, start_loc, end_loc, datetime"
+    with con.cursor() as curs:
+        curs.execute(query, params)
+        return curs.fetchall()
+
+
+def get_overlapping(con, title, start_loc, end_loc):
+    """Get the highlights and notes of a book with a location between
+    start_loc and end_loc, inclusive, as (kind, content, start_loc, end_loc)
+    rows ordered by location. Notes have start_loc == end_loc. The bounds may
+    be given in either order."""
+
+    start_loc, end_loc = min(start_loc, end_loc), max(start_loc, end_loc)
+    query = """SELECT 'highlight', content, start_loc, end_loc
+                FROM highlights
+                WHERE title = %(title)s
+                AND loc_range && int4range(%(start)s, %(end)s, '[]')
+                UNION ALL
+                SELECT 'note', content, location, location
+                FROM notes
+                WHERE title = %(title)s
+                AND loc_range && int4range(%(start)s, %(end)s, '[]')
+                ORDER BY 3, 4"""
+    params = {"title": title, "start": start_loc, "end": end_loc}
+    with con.cursor() as curs:
+        curs.execute(query, params)
+        return curs.fetchall()
+
+
+def get_coverage(con, title=None):
+    """Get the number of distinct locations highlighted per book, counting
+    overlapping highlights once"""
+
+    source, params = "highlights", ()
+    if title is not None:
+        source = "(SELECT * FROM highlights WHERE title = %s) AS h"
+        params = (title,)
+    with con.cursor() as curs:
+        curs.execute(coverage_query(source, "title"), params)
+        return {row_title: int(covered) for row_title, covered in curs.fetchall()}
+
+
+def merge_intervals(intervals):
+    """Merge closed (start, end) intervals that overlap or touch"""
+
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(m) for m in merged]
+
+
+def coverage(intervals):
+    """Count the integer locations covered by closed (start, end) intervals"""
+
+    return sum(end - start + 1 for start, end in merge_intervals(intervals))
+
+
+class IntervalNode:
+    def __init__(self, center, intervals, left, right):
+        self.center = center
+        self.by_start = intervals
+        self.by_end = sorted(intervals, key=lambda iv: iv[1], reverse=True)
+        self.left = left
+        self.right = right
+
+
+class IntervalTree:
+    """Static centered interval tree over closed (start, end, item) intervals,
+    the offline counterpart of the loc_range GiST indexes.
+
+    overlapping(lo, hi) finds the k intervals overlapping [lo, hi] in
+    O(log n + k). They come back in tree order, so callers that want them by
+    location sort them. Like get_overlapping, it accepts the bounds in either
+    order.
+    """
+
+    def __init__(self, intervals):
+        self.intervals = sorted(intervals, key=lambda iv: (iv[0], iv[1]))
+        self.root = self.build(self.intervals)
+
+    @classmethod
+    def build(cls, intervals):
+        """Build a subtree from intervals sorted by start. The center is the
+        start of the median interval, so no node is empty and both subtrees
+        hold at most half of the intervals."""
+
+        if not intervals:
+            return None
+        center = intervals[len(intervals) // 2][0]
+        left, here, right = [], [], []
+        for iv in intervals:
+            if iv[1] < center:
+                left.append(iv)
+            elif iv[0] > center:
+                right.append(iv)
+            else:
+                here.append(iv)
+        return IntervalNode(center, here, cls.build(left), cls.build(right))
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def overlapping(self, lo, hi):
+        lo, hi = min(lo, hi), max(lo, hi)
+        results = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            if hi < node.center:
+                for iv in node.by_start:
+                    if iv[0] > hi:
+                        break
+                    results.append(iv)
+                stack.append(node.left)
+            elif lo > node.center:
+                for iv in node.by_end:
+                    if iv[1] < lo:
+                        break
+                    results.append(iv)
+                stack.append(node.right)
+            else:
+                results.extend(node.by_start)
+                stack.append(node.left)
+                stack.append(node.right)
+        return results
+
+    def coverage(self):
+        return coverage((iv[0], iv[1]) for iv in self.intervals)
+
+
+def build_interval_index(notes, highlights):
+    """Index Note and Highlight objects by title in IntervalTrees of
+    (start_loc, end_loc, clipping). Notes cover their single location."""
+
+    intervals = {}
+    for n in notes:
+        intervals.setdefault(n.title, []).append((n.end_loc, n.end_loc, n))
+    for h in highlights:
+        intervals.setdefault(h.title, []).append((h.start_loc, h.end_loc, h))
+    return {title: IntervalTree(ivs) for title, ivs in intervals.items()}
+
+
+if __name__ == "__main__":
+    from my_clippings import cli
+
+    cli.main()
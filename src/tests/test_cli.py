@@ -0,0 +1,146 @@
+import contextlib
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from my_clippings.cli import *
+
+
+class TestParser(unittest.TestCase):
+    def setUp(self):
+        self.parser = build_parser()
+
+    def test_ingest(self):
+        args = self.parser.parse_args(
+            ["ingest", "clippings.txt", "--workers", "4", "--batch-size", "100"]
+        )
+        assert args.func == cmd_ingest
+        assert args.fn == "clippings.txt"
+        assert args.workers == 4
+        assert args.batch_size == 100
+        assert args.backend == "postgres"
+        assert not args.no_cache
+
+    def test_query(self):
+        args = self.parser.parse_args(
+            ["query", "highlights", "--backend", "memory", "--file", "c.txt", "Title"]
+        )
+        assert args.func == cmd_query_highlights
+        assert args.backend == "memory"
+        assert args.file == "c.txt"
+        assert args.title == "Title"
+        assert args.workers == 1
+        assert not hasattr(args, "batch_size")
+
+    def test_bench_defaults_to_memory(self):
+        args = self.parser.parse_args(["bench", "clippings.txt"])
+        assert args.backend == "memory"
+
+        args = self.parser.parse_args(["ingest", "clippings.txt"])
+        assert args.backend == "postgres"
+
+    def test_workers_must_be_positive(self):
+        with self.assertRaises(SystemExit):
+            self.parser.parse_args(["ingest", "clippings.txt", "--workers", "0"])
+
+    def test_timeline(self):
+        args = self.parser.parse_args(["query", "timeline", "--daily"])
+        assert args.func == cmd_query_timeline
+        assert args.daily
+        assert args.title is None
+
+    def test_overlaps(self):
+        args = self.parser.parse_args(["query", "overlaps", "Title", "1200", "1500"])
+        assert args.func == cmd_query_overlaps
+        assert (args.start, args.end) == (1200, 1500)
+
+    def test_export(self):
+        args = self.parser.parse_args(["export", "--format", "json"])
+        assert args.func == cmd_export
+        assert args.format == "json"
+        assert args.backend == "postgres"
+        assert args.output is None
+
+
+class TestMemoryBackend(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.fn = os.path.join(self.tmp_dir.name, "My Clippings.txt")
+        with open(self.fn, "w") as f:
+            f.write(
+                """The Compound Effect (Darren Hardy)
+- Your Highlight Location 620-630 | Added on Friday, December 11, 2020 1:42:54 PM
+
+Become very conscious of every choice you make today.
+==========
+The Compound Effect (Darren Hardy)
+- Your Note Location 548 | Added on Friday, December 11, 2020 1:24:32 PM
+
+amazingly thoughtful and mutually beneficial gift idea for a loved one
+==========
+The Compound Effect (Darren Hardy)
+- Your Highlight Location 626-626 | Added on Friday, December 11, 2020 1:49:33 PM
+
+All winners are trackers.
+==========
+"""
+            )
+        self.cache_args = ["--cache-dir", os.path.join(self.tmp_dir.name, "cache")]
+
+    def run_cli(self, argv):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            main(argv)
+        return out.getvalue()
+
+    def test_ingest(self):
+        out = self.run_cli(["ingest", "--backend", "memory", self.fn] + self.cache_args)
+        assert out == "parsed 2 highlights and 1 notes\n", out
+
+    def test_export_csv(self):
+        out = self.run_cli(
+            ["export", "--backend", "memory", "--file", self.fn] + self.cache_args
+        )
+        rows = list(csv.reader(io.StringIO(out)))
+        assert rows[0] == EXPORT_FIELDS, rows
+        assert [r[0] for r in rows[1:]] == ["note", "highlight", "highlight"], rows
+        assert rows[1][2:4] == ["548", "548"], rows[1]
+        assert rows[1][4] == "2020-12-11T13:24:32+00:00", rows[1]
+
+    def test_export_json(self):
+        output = os.path.join(self.tmp_dir.name, "clippings.json")
+        out = self.run_cli(
+            ["export", "--backend", "memory", "--file", self.fn]
+            + ["--format", "json", "--output", output, "--no-cache"]
+        )
+        assert out == "", out
+        with open(output) as f:
+            clippings = json.load(f)
+        assert [c["start_loc"] for c in clippings] == [548, 620, 626], clippings
+        assert clippings[1] == {
+            "kind": "highlight",
+            "title": "The Compound Effect (Darren Hardy)",
+            "start_loc": 620,
+            "end_loc": 630,
+            "datetime": "2020-12-11T13:42:54+00:00",
+            "content": "Become very conscious of every choice you make today.",
+        }, clippings[1]
+
+    def test_query_overlaps(self):
+        argv = ["query", "overlaps", "--backend", "memory", "--file", self.fn]
+        out = self.run_cli(
+            argv + self.cache_args + ["The Compound Effect (Darren Hardy)", "628", "540"]
+        )
+        assert out.splitlines() == [
+            "note\t548-548\tamazingly thoughtful and mutually beneficial gift idea "
+            "for a loved one",
+            "highlight\t620-630\tBecome very conscious of every choice you make "
+            "today.",
+            "highlight\t626-626\tAll winners are trackers.",
+        ], out
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
@@ -1,9 +1,14 @@
 import datetime
+import json
+import os
+import tempfile
 import unittest
+from unittest import mock
+import zlib
 
 import psycopg2
 
-from ingest import *
+from my_clippings.ingest import *
 
 
 class TestIngest(unittest.TestCase):
@@ -132,6 +137,146 @@ comparing the content of the newly-fetched featureA branch with her local copy o
         assert date == "Saturday, April 18, 2020 11:21:19 AM"
 
 
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        self.clippings = """The Compound Effect (Darren Hardy)
+- Your Highlight Location 626-626 | Added on Friday, December 11, 2020 1:42:54 PM
+
+Become very conscious of every choice you make today so you can begin to make smarter choices moving forward.
+==========
+The Compound Effect (Darren Hardy)
+- Your Note Location 548 | Added on Friday, December 11, 2020 1:24:32 PM
+
+amazingly thoughtful and mutually beneficial gift idea for a loved one
+==========
+The Compound Effect (Darren Hardy)
+- Your Highlight Location 666-668 | Added on Friday, December 11, 2020 1:49:33 PM
+
+All winners are trackers.
+==========
+"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ParseCache(self.tmp_dir.name)
+
+    def test_chunk_clippings(self):
+        chunks = chunk_clippings(self.clippings, chunk_size=1)
+        assert len(chunks) == 3, chunks
+        assert "".join(chunks) == self.clippings
+        assert all(c.endswith("==========\n") for c in chunks)
+
+        chunks = chunk_clippings(self.clippings, chunk_size=len(self.clippings))
+        assert chunks == [self.clippings], chunks
+
+    def test_parse_clippings(self):
+        records = parse_clippings(self.clippings)
+        assert [r[0] for r in records] == ["highlight", "note", "highlight"]
+        assert records[1][4] == "548", records[1]
+        assert records == parse_clippings(self.clippings, chunk_size=1)
+
+    def test_cache_hit(self):
+        records = parse_clippings(self.clippings, self.cache, chunk_size=1)
+        assert len(self.cache.entries) == 3
+
+        # a reloaded cache serves every chunk without reparsing
+        cache = ParseCache(self.tmp_dir.name)
+        with mock.patch("my_clippings.ingest.parse_chunk") as parse_chunk_mock:
+            cached = parse_clippings(self.clippings, cache, chunk_size=1)
+        parse_chunk_mock.assert_not_called()
+        assert cached == records
+
+    def test_lru_eviction(self):
+        self.cache.max_entries = 2
+        chunks = chunk_clippings(self.clippings, chunk_size=1)
+        self.cache.put(chunks[0], parse_chunk(chunks[0]))
+        self.cache.put(chunks[1], parse_chunk(chunks[1]))
+        self.cache.get(chunks[0])
+        self.cache.put(chunks[2], parse_chunk(chunks[2]))
+
+        assert self.cache.get(chunks[1]) is None
+        assert self.cache.get(chunks[0]) is not None
+        assert len(os.listdir(self.tmp_dir.name)) == 2
+
+    def test_version_mismatch(self):
+        chunk = chunk_clippings(self.clippings, chunk_size=1)[0]
+        self.cache.put(chunk, parse_chunk(chunk))
+        key = ParseCache.chunk_key(chunk)
+        with open(self.cache.entry_path(key), "wb") as f:
+            payload = json.dumps({"version": -1, "records": []})
+            f.write(zlib.compress(payload.encode()))
+
+        assert self.cache.get(chunk) is None
+        assert key not in self.cache.entries
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+
+class TestIntervalTree(unittest.TestCase):
+    def setUp(self):
+        self.intervals = [
+            (626, 626, "a"),
+            (636, 637, "b"),
+            (548, 548, "c"),
+            (666, 668, "d"),
+            (630, 640, "e"),
+        ]
+        self.tree = IntervalTree(self.intervals)
+
+    def test_overlapping(self):
+        found = sorted(iv[2] for iv in self.tree.overlapping(626, 636))
+        assert found == ["a", "b", "e"], found
+
+        found = list(self.tree.overlapping(641, 665))
+        assert found == [], found
+
+        assert sorted(self.tree.overlapping(636, 626)) == sorted(
+            self.tree.overlapping(626, 636)
+        )
+
+        found = sorted(iv[2] for iv in self.tree.overlapping(0, 1000))
+        assert found == ["a", "b", "c", "d", "e"], found
+
+    def test_overlapping_matches_scan(self):
+        intervals = [(s, s + (s * 7) % 13, s) for s in range(0, 400, 3)]
+        tree = IntervalTree(intervals)
+        for lo, hi in [(0, 0), (50, 60), (101, 101), (390, 500), (-10, -1)]:
+            expected = [iv for iv in intervals if iv[0] <= hi and iv[1] >= lo]
+            assert sorted(tree.overlapping(lo, hi)) == expected, (lo, hi)
+
+    def test_coverage(self):
+        assert merge_intervals([(5, 8), (1, 3), (4, 4), (10, 12), (11, 11)]) == [
+            (1, 8),
+            (10, 12),
+        ]
+        assert coverage([(1, 3), (2, 5), (10, 10)]) == 6
+        assert self.tree.coverage() == 1 + 1 + 11 + 3
+
+    def test_build_interval_index(self):
+        records = parse_clippings(
+            """The Compound Effect (Darren Hardy)
+- Your Highlight Location 626-630 | Added on Friday, December 11, 2020 1:42:54 PM
+
+Become very conscious of every choice you make today.
+==========
+The Compound Effect (Darren Hardy)
+- Your Note Location 628 | Added on Friday, December 11, 2020 1:43:32 PM
+
+a note
+==========
+"""
+        )
+        index = build_interval_index(*records_to_clippings(records))
+        tree = index["The Compound Effect (Darren Hardy)"]
+        found = sorted(
+            (s, e, type(c).__name__) for s, e, c in tree.overlapping(627, 627)
+        )
+        assert found == [(626, 630, "Highlight")], found
+        found = sorted(
+            (s, e, type(c).__name__) for s, e, c in tree.overlapping(628, 700)
+        )
+        assert found == [(626, 630, "Highlight"), (628, 628, "Note")], found
+
+
 class TestPostgres(unittest.TestCase):
     def setUp(self):
         # grab these from env vars
@@ -272,6 +417,143 @@ class TestBatchProcess(unittest.TestCase):
         self.pg_importer.destroy_db()
 
 
+class TestTimeline(unittest.TestCase):
+    def setUp(self):
+        self.db = "test_myclippings"
+        self.usr = "postgres"
+        self.pw = "mypassword"
+        self.host = "127.0.0.1"
+        self.port = "5432"
+        self.pg_importer = PostgresImporter(
+            self.db, self.usr, self.pw, self.host, self.port
+        )
+
+        self.connection = self.pg_importer.get_connection()
+        Highlight.create_table(self.connection)
+
+        self.title = "The Compound Effect (Darren Hardy)"
+        self.first = datetime.datetime(
+            2020, 12, 11, 13, 42, tzinfo=datetime.timezone.utc
+        )
+        self.last = datetime.datetime(2020, 12, 12, 9, 5, tzinfo=datetime.timezone.utc)
+        self.highlights = [
+            Highlight(self.title, "first", self.first, "626-626"),
+            Highlight(self.title, "second", self.last, "636-640"),
+        ]
+
+    def test_incremental_update(self):
+        Highlight.write_many_to_db(self.connection, self.highlights[:1])
+        Highlight.write_many_to_db(self.connection, self.highlights)
+
+        timeline = get_book_timeline(self.connection, self.title)
+        assert timeline == [(self.title, self.first, self.last, 2, 626, 640, 6)]
+
+        daily = get_daily_timeline(self.connection, self.title)
+        assert [(row[0].day, row[3]) for row in daily] == [(11, 1), (12, 1)], daily
+
+    def test_coverage_counts_overlaps_once(self):
+        Highlight.write_many_to_db(self.connection, self.highlights)
+        overlapping = Highlight(
+            self.title,
+            "around first",
+            self.first + datetime.timedelta(minutes=5),
+            "620-630",
+        )
+        Highlight.write_many_to_db(self.connection, [overlapping])
+
+        timeline = get_book_timeline(self.connection, self.title)
+        assert timeline[0][3:] == (3, 620, 640, 11 + 5), timeline
+        assert get_coverage(self.connection, self.title) == {self.title: 11 + 5}
+
+        daily = get_daily_timeline(self.connection, self.title)
+        assert [(row[0].day, row[3], row[6]) for row in daily] == [
+            (11, 2, 11),
+            (12, 1, 5),
+        ], daily
+
+        overlapping.delete_from_db(self.connection)
+        timeline = get_book_timeline(self.connection, self.title)
+        assert timeline[0][3:] == (2, 626, 640, 1 + 5), timeline
+
+    def test_days_across_books(self):
+        Highlight.write_many_to_db(self.connection, self.highlights)
+        other = Highlight(
+            "Deep Work (Cal Newport)",
+            "other",
+            self.first - datetime.timedelta(hours=1),
+            "100-109",
+        )
+        Highlight.write_many_to_db(self.connection, [other])
+
+        days = get_daily_timeline(self.connection)
+        assert days == [
+            (self.first.date(), other.dt, self.first, 2, 2, 1 + 10),
+            (self.last.date(), self.last, self.last, 1, 1, 5),
+        ], days
+
+        self.highlights[0].delete_from_db(self.connection)
+        days = get_daily_timeline(self.connection)
+        assert [row[3:] for row in days] == [(1, 1, 10), (1, 1, 5)], days
+
+    def test_refresh_after_delete(self):
+        Highlight.write_many_to_db(self.connection, self.highlights)
+        self.highlights[1].delete_from_db(self.connection)
+
+        timeline = get_book_timeline(self.connection, self.title)
+        assert timeline == [(self.title, self.first, self.first, 1, 626, 626, 1)]
+
+    def tearDown(self):
+        self.connection.close()
+        self.pg_importer.destroy_db()
+
+
+class TestIntervals(unittest.TestCase):
+    def setUp(self):
+        self.db = "test_myclippings"
+        self.usr = "postgres"
+        self.pw = "mypassword"
+        self.host = "127.0.0.1"
+        self.port = "5432"
+        self.pg_importer = PostgresImporter(
+            self.db, self.usr, self.pw, self.host, self.port
+        )
+
+        self.connection = self.pg_importer.get_connection()
+        Highlight.create_table(self.connection)
+        Note.create_table(self.connection)
+
+        self.title = "The Compound Effect (Darren Hardy)"
+        dt = datetime.datetime(2020, 12, 11, 13, 42, tzinfo=datetime.timezone.utc)
+        Highlight.write_many_to_db(
+            self.connection,
+            [
+                Highlight(self.title, "first", dt, "1200-1210"),
+                Highlight(self.title, "second", dt, "1205-1220"),
+                Highlight(self.title, "third", dt, "1600-1601"),
+            ],
+        )
+        Note.write_many_to_db(self.connection, [Note(self.title, "note", dt, "1500")])
+
+    def test_get_overlapping(self):
+        rows = get_overlapping(self.connection, self.title, 1210, 1500)
+        assert rows == [
+            ("highlight", "first", 1200, 1210),
+            ("highlight", "second", 1205, 1220),
+            ("note", "note", 1500, 1500),
+        ], rows
+
+    def test_get_overlapping_reversed_bounds(self):
+        rows = get_overlapping(self.connection, self.title, 1500, 1210)
+        assert rows == get_overlapping(self.connection, self.title, 1210, 1500)
+
+    def test_get_coverage(self):
+        assert get_coverage(self.connection) == {self.title: 21 + 2}
+
+    def tearDown(self):
+        self.connection.close()
+        self.pg_importer.destroy_db()
+
+
 class TestViews(unittest.TestCase):
     # ? can I use fixtures to prepopulate the database with highlights
     # and notes??